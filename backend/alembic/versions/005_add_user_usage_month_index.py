@@ -0,0 +1,24 @@
+"""add user usage month index
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Index month so the monthly usage reset can seek instead of scanning
+    op.create_index(op.f('ix_user_usage_month'), 'user_usage', ['month'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_usage_month'), table_name='user_usage')
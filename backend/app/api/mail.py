@@ -8,7 +8,7 @@ import os
 
 from app.models import get_db, User
 from app.api.auth import get_current_user
-from app.services.mail import email_service
+from app.services.mail import email_service, RateLimitExceeded
 from app.utils import get_logger
 from app.plans import PlanFeatures
 
@@ -73,6 +73,12 @@ async def send_email(
         
         return result
         
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -146,6 +152,12 @@ async def send_email_with_attachments(
         
         return result
         
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
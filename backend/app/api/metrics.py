@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Response
+from sqlalchemy import func
 from app.tasks.monitoring_tasks import get_prometheus_metrics, get_queue_metrics
 from app.middleware import get_email_usage_stats
-from app.models import get_db, User
+from app.models import get_db, User, UserPlan
 from app.utils import get_logger
 
 router = APIRouter()
@@ -43,15 +44,13 @@ async def get_system_stats():
     try:
         db = next(get_db())
         
-        # User statistics
-        total_users = db.query(User).count()
-        active_users = db.query(User).filter(User.is_active == True).count()
-        verified_users = db.query(User).filter(User.is_verified == True).count()
-        
-        # Plan distribution
-        free_users = db.query(User).filter(User.plan == "free").count()
-        pro_users = db.query(User).filter(User.plan == "pro").count()
-        enterprise_users = db.query(User).filter(User.plan == "enterprise").count()
+        # User statistics and plan distribution in a single scan of users
+        total_users, active_users, verified_users, *plan_counts = db.query(
+            func.count(User.id),
+            func.count(User.id).filter(User.is_active == True),
+            func.count(User.id).filter(User.is_verified == True),
+            *[func.count(User.id).filter(User.plan == plan) for plan in UserPlan]
+        ).one()
         
         return {
             "users": {
@@ -59,9 +58,7 @@ async def get_system_stats():
                 "active": active_users,
                 "verified": verified_users,
                 "plan_distribution": {
-                    "free": free_users,
-                    "pro": pro_users,
-                    "enterprise": enterprise_users
+                    plan.value: count for plan, count in zip(UserPlan, plan_counts)
                 }
             },
             "timestamp": "2024-01-01T00:00:00Z"  # Placeholder
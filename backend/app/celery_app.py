@@ -1,7 +1,28 @@
 import os
+import orjson
 from celery import Celery
+from kombu.serialization import register
 from app.config import settings
 
+# orjson-backed serializer for task payloads and results. Datetimes are
+# emitted as ISO 8601 strings natively, so tasks can return them as-is.
+# Naive datetimes are the models' utcnow() values and are marked as UTC.
+# Workers accept it from this release on, but producers keep sending json
+# (CELERY_SERIALIZER) until no worker with the json-only config is left;
+# otherwise those workers would reject the new messages mid-deploy.
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, option=ORJSON_OPTIONS)
+
+register(
+    "orjson",
+    _orjson_dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="binary"
+)
+
 # Celery configuration
 celery_app = Celery(
     "oxlas_suite",
@@ -12,9 +33,9 @@ celery_app = Celery(
 
 # Celery configuration
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer=settings.CELERY_SERIALIZER,
+    accept_content=["orjson", "json"],
+    result_serializer=settings.CELERY_SERIALIZER,
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
@@ -16,11 +16,19 @@ class Settings:
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
     
     # Application
     APP_NAME: str = "Oxlas Suite Backend"
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
+    # File storage roots
+    MAIL_STORAGE_PATH: str = os.getenv("MAIL_STORAGE_PATH", "storage")
+    DRIVE_STORAGE_PATH: str = os.getenv("DRIVE_STORAGE_PATH", "drive_storage")
+    
+    # Celery message format; switch to "orjson" once every worker accepts it
+    CELERY_SERIALIZER: str = os.getenv("CELERY_SERIALIZER", "json")
+    
     @property
     def DATABASE_URL(self) -> str:
         # Use SQLite for local development without Docker
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy.orm import Session
 import uvicorn
 
@@ -19,7 +19,8 @@ app = FastAPI(
     title=settings.APP_NAME,
     description="Oxlas Suite Backend API",
     version="1.0.0",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -1,7 +1,7 @@
 from .plan_middleware import PlanMiddleware, require_plan, check_feature_access
-from .rate_limiter import RateLimitMiddleware, check_email_limits, get_email_usage_stats
+from .rate_limiter import RateLimitMiddleware, check_rate_limit, check_email_limits, get_email_usage_stats
 
 __all__ = [
     "PlanMiddleware", "require_plan", "check_feature_access",
-    "RateLimitMiddleware", "check_email_limits", "get_email_usage_stats"
+    "RateLimitMiddleware", "check_rate_limit", "check_email_limits", "get_email_usage_stats"
 ]
\ No newline at end of file
@@ -1,7 +1,8 @@
 from fastapi import HTTPException, status, Request
 from fastapi.responses import JSONResponse
 from typing import Callable, Optional
-from app.tasks.monitoring_tasks import check_rate_limit
+from sqlalchemy import and_
+from app.tasks.monitoring_tasks import check_rate_limit, get_user_plan
 from app.plans import PlanFeatures
 from app.models import get_db, UserUsage, User
 from datetime import datetime
@@ -51,7 +52,7 @@ class RateLimitMiddleware:
                         "detail": "Monthly email limit exceeded",
                         "current_plan": current_user.plan.value,
                         "emails_sent": usage.emails_sent,
-                        "limit": PlanFeatures.get_plan_features(current_user.plan.value)["max_emails_per_month"]
+                        "limit": PlanFeatures.get_plan_limits(current_user.plan.value)["max_emails_per_month"]
                     }
                 )
         
@@ -61,10 +62,10 @@ class RateLimitMiddleware:
 def check_email_limits(user_id: int) -> dict:
     """Check both rate and monthly limits for email sending"""
     try:
-        db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
+        # Plans change rarely, so the short-lived plan cache stands in for a User read
+        plan = get_user_plan(user_id)
         
-        if not user:
+        if plan is None:
             return {"allowed": False, "reason": "User not found"}
         
         # Check rate limit
@@ -76,27 +77,27 @@ def check_email_limits(user_id: int) -> dict:
             }
         
         # Check monthly usage limit
+        db = next(get_db())
         current_month = datetime.utcnow().strftime("%Y-%m")
-        usage = db.query(UserUsage).filter(
+        emails_sent = db.query(UserUsage.emails_sent).filter(
             UserUsage.user_id == user_id,
             UserUsage.month == current_month
-        ).first()
+        ).scalar() or 0
         
-        emails_sent = usage.emails_sent if usage else 0
+        max_emails_per_month = PlanFeatures.get_plan_limits(plan)["max_emails_per_month"]
         
-        if not PlanFeatures.check_email_monthly_limit(user.plan.value, emails_sent):
-            plan_features = PlanFeatures.get_plan_features(user.plan.value)
+        if not PlanFeatures.check_email_monthly_limit(plan, emails_sent):
             return {
                 "allowed": False,
                 "reason": "monthly_limit_exceeded",
                 "emails_sent": emails_sent,
-                "limit": plan_features["max_emails_per_month"]
+                "limit": max_emails_per_month
             }
         
         return {
             "allowed": True,
             "emails_sent": emails_sent,
-            "remaining": PlanFeatures.get_plan_features(user.plan.value)["max_emails_per_month"] - emails_sent
+            "remaining": max_emails_per_month - emails_sent if max_emails_per_month != "unlimited" else "unlimited"
         }
         
     except Exception as e:
@@ -107,28 +108,28 @@ def get_email_usage_stats(user_id: int) -> dict:
     """Get email usage statistics for a user"""
     try:
         db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
+        current_month = datetime.utcnow().strftime("%Y-%m")
         
-        if not user:
-            return {"error": "User not found"}
+        # Plan and this month's counters in one point read; the counters are
+        # kept up to date by the send path, so nothing is summed here
+        row = db.query(User.plan, UserUsage.emails_sent, UserUsage.emails_received).outerjoin(
+            UserUsage,
+            and_(UserUsage.user_id == User.id, UserUsage.month == current_month)
+        ).filter(User.id == user_id).first()
         
-        # Get current month usage
-        current_month = datetime.utcnow().strftime("%Y-%m")
-        usage = db.query(UserUsage).filter(
-            UserUsage.user_id == user_id,
-            UserUsage.month == current_month
-        ).first()
+        if not row:
+            return {"error": "User not found"}
         
-        emails_sent = usage.emails_sent if usage else 0
-        emails_received = usage.emails_received if usage else 0
+        plan = row.plan.value
+        emails_sent = row.emails_sent or 0
+        emails_received = row.emails_received or 0
         
         # Get plan limits
-        plan_features = PlanFeatures.get_plan_features(user.plan.value)
-        max_emails_per_month = plan_features["max_emails_per_month"]
+        max_emails_per_month = PlanFeatures.get_plan_limits(plan)["max_emails_per_month"]
         
         return {
             "user_id": user_id,
-            "plan": user.plan.value,
+            "plan": plan,
             "current_month": current_month,
             "emails_sent": emails_sent,
             "emails_received": emails_received,
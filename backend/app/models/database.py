@@ -46,7 +46,7 @@ class EmailVerificationToken(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     token = Column(String(255), unique=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     used_at = Column(DateTime, nullable=True)
     
@@ -59,7 +59,7 @@ class PasswordResetToken(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     token = Column(String(255), unique=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     used_at = Column(DateTime, nullable=True)
     
@@ -71,7 +71,7 @@ class UserUsage(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    month = Column(String(7), nullable=False)  # YYYY-MM format
+    month = Column(String(7), index=True, nullable=False)  # YYYY-MM format
     emails_sent = Column(Integer, default=0, nullable=False)
     emails_received = Column(Integer, default=0, nullable=False)
     storage_used_bytes = Column(Integer, default=0, nullable=False)
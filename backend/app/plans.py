@@ -1,5 +1,31 @@
-from typing import Dict, Any
+import math
+from typing import Dict, Any, Mapping, Union
 from enum import Enum
+from types import MappingProxyType
+
+LIMIT_KEYS = (
+    "storage_limit_gb",
+    "max_upload_size_mb",
+    "max_aliases",
+    "max_team_members",
+    "api_rate_limit",
+    "max_projects",
+    "max_file_versions",
+    "max_emails_per_month",
+    "max_emails_per_minute"
+)
+
+def _freeze_plan(plan: Dict[str, Any]) -> Mapping[str, Any]:
+    """Make a plan definition read-only, keeping the feature order"""
+    return MappingProxyType({**plan, "features": tuple(plan["features"])})
+
+def _plan_limits(plan: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Pick the numeric limits out of a plan definition, read-only"""
+    return MappingProxyType({key: plan[key] for key in LIMIT_KEYS})
+
+def _comparable_limit(limit: Union[int, str]) -> float:
+    """Turn an "unlimited" limit into infinity so it compares like a number"""
+    return math.inf if limit == "unlimited" else limit
 
 class PlanFeatures:
     """Configuration for different subscription plans"""
@@ -69,16 +95,28 @@ class PlanFeatures:
         }
     }
     
+    # Plan tables are fixed, so they are frozen once at import and shared
+    PLANS = MappingProxyType({name: _freeze_plan(plan) for name, plan in PLANS.items()})
+    FEATURE_SETS = MappingProxyType({name: frozenset(plan["features"]) for name, plan in PLANS.items()})
+    LIMITS = MappingProxyType({name: _plan_limits(plan) for name, plan in PLANS.items()})
+    
+    # Email limits checked on every send, as plain per-plan lookups
+    MONTHLY_EMAIL_LIMITS = MappingProxyType({
+        name: _comparable_limit(limits["max_emails_per_month"]) for name, limits in LIMITS.items()
+    })
+    EMAIL_RATE_LIMITS = MappingProxyType({
+        name: limits["max_emails_per_minute"] for name, limits in LIMITS.items()
+    })
+    
     @classmethod
-    def get_plan_features(cls, plan: str) -> Dict[str, Any]:
+    def get_plan_features(cls, plan: str) -> Mapping[str, Any]:
         """Get features for a specific plan"""
         return cls.PLANS.get(plan, cls.PLANS["free"])
     
     @classmethod
     def check_feature_access(cls, plan: str, feature: str) -> bool:
         """Check if a plan has access to a specific feature"""
-        plan_features = cls.get_plan_features(plan)
-        return feature in plan_features["features"]
+        return feature in cls.FEATURE_SETS.get(plan, cls.FEATURE_SETS["free"])
     
     @classmethod
     def check_storage_limit(cls, plan: str, current_usage_gb: float) -> bool:
@@ -114,34 +152,16 @@ class PlanFeatures:
         return current_members <= member_limit
     
     @classmethod
-    def get_plan_limits(cls, plan: str) -> Dict[str, Any]:
+    def get_plan_limits(cls, plan: str) -> Mapping[str, Any]:
         """Get all limits for a specific plan"""
-        plan_features = cls.get_plan_features(plan)
-        return {
-            "storage_limit_gb": plan_features["storage_limit_gb"],
-            "max_upload_size_mb": plan_features["max_upload_size_mb"],
-            "max_aliases": plan_features["max_aliases"],
-            "max_team_members": plan_features["max_team_members"],
-            "api_rate_limit": plan_features["api_rate_limit"],
-            "max_projects": plan_features["max_projects"],
-            "max_file_versions": plan_features["max_file_versions"],
-            "max_emails_per_month": plan_features["max_emails_per_month"],
-            "max_emails_per_minute": plan_features["max_emails_per_minute"]
-        }
+        return cls.LIMITS.get(plan, cls.LIMITS["free"])
     
     @classmethod
     def check_email_monthly_limit(cls, plan: str, current_usage: int) -> bool:
         """Check if user is within monthly email limit"""
-        plan_features = cls.get_plan_features(plan)
-        max_emails = plan_features["max_emails_per_month"]
-        
-        if max_emails == "unlimited":
-            return True
-        
-        return current_usage < max_emails
+        return current_usage < cls.MONTHLY_EMAIL_LIMITS.get(plan, cls.MONTHLY_EMAIL_LIMITS["free"])
     
     @classmethod
     def check_email_rate_limit(cls, plan: str) -> int:
         """Get email rate limit per minute for a plan"""
-        plan_features = cls.get_plan_features(plan)
-        return plan_features["max_emails_per_minute"]
\ No newline at end of file
+        return cls.EMAIL_RATE_LIMITS.get(plan, cls.EMAIL_RATE_LIMITS["free"])
\ No newline at end of file
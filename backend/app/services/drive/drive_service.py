@@ -8,7 +8,7 @@ from datetime import datetime, timedelta
 import aiofiles
 from fastapi import UploadFile, HTTPException, status
 
-from app.models import get_db, User, DriveFile, DriveFolder, DriveShare
+from app.models import get_db, User, UserUsage, DriveFile, DriveFolder, DriveShare
 from app.utils import get_logger
 from app.config import settings
 from app.plans import PlanFeatures
@@ -17,8 +17,8 @@ logger = get_logger(__name__)
 
 class DriveService:
     def __init__(self):
-        self.base_path = Path("drive_storage")
-        self.base_path.mkdir(exist_ok=True)
+        self.base_path = Path(settings.DRIVE_STORAGE_PATH)
+        self.base_path.mkdir(parents=True, exist_ok=True)
         
         # Create user directories
         self.user_storage = self.base_path / "users"
@@ -1,3 +1,3 @@
-from .email_service import EmailService, email_service
+from .email_service import EmailService, RateLimitExceeded, email_service
 
-__all__ = ["EmailService", "email_service"]
\ No newline at end of file
+__all__ = ["EmailService", "RateLimitExceeded", "email_service"]
\ No newline at end of file
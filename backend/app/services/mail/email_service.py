@@ -1,5 +1,4 @@
 import os
-import uuid
 import aiofiles
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
@@ -10,7 +9,10 @@ from email import encoders
 import aiosmtplib
 import aioimaplib
 import re
+import ahocorasick
 from pathlib import Path
+from sqlalchemy import and_
+from sqlalchemy.orm import selectinload
 
 from app.tasks.email_tasks import send_email_task
 from app.middleware import check_email_limits
@@ -21,7 +23,46 @@ from app.plans import PlanFeatures
 
 logger = get_logger(__name__)
 
+STORAGE_PATH = Path(settings.MAIL_STORAGE_PATH)
+STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+
+SPAM_KEYWORDS = frozenset([
+    "spam", "scam", "phishing", "winner", "congratulations",
+    "urgent", "act now", "limited time", "free money", "click here"
+])
+
+# Literal keywords are matched in a single pass with an Aho-Corasick automaton;
+# regexes are reserved for the patterns that actually need them.
+SPAM_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _keyword in SPAM_KEYWORDS:
+    SPAM_KEYWORD_AUTOMATON.add_word(_keyword, _keyword)
+SPAM_KEYWORD_AUTOMATON.make_automaton()
+
+SUSPICIOUS_PATTERNS = (
+    r'\$\d+',  # Money amounts
+    r'http://\S+',  # HTTP links
+    r'click\s+here',  # Click here
+)
+_SPAM_RE = re.compile("|".join(SUSPICIOUS_PATTERNS))
+
+# Spam indicators almost always appear early; bound the scan for long bodies
+SPAM_SCAN_LIMIT = 8192
+
+class RateLimitExceeded(ValueError):
+    """Raised when a send is refused by the per-minute rate limit"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limit exceeded. Retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    """Format an optional datetime column as ISO 8601"""
+    return dt.isoformat() if dt else None
+
 class EmailService:
+    storage_path = STORAGE_PATH
+    spam_keywords = SPAM_KEYWORDS
+    
     def __init__(self):
         self.smtp_host = os.getenv("SMTP_HOST", "localhost")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
@@ -32,14 +73,6 @@ class EmailService:
         self.imap_host = os.getenv("IMAP_HOST", "localhost")
         self.imap_port = int(os.getenv("IMAP_PORT", "993"))
         self.imap_use_ssl = os.getenv("IMAP_USE_SSL", "true").lower() == "true"
-        
-        self.storage_path = Path("storage")
-        self.storage_path.mkdir(exist_ok=True)
-        
-        self.spam_keywords = [
-            "spam", "scam", "phishing", "winner", "congratulations",
-            "urgent", "act now", "limited time", "free money", "click here"
-        ]
     
     async def send_email(
         self,
@@ -59,16 +92,21 @@ class EmailService:
         limit_check = check_email_limits(user_id)
         if not limit_check["allowed"]:
             if limit_check["reason"] == "rate_limit_exceeded":
-                raise ValueError(f"Rate limit exceeded. Retry after {limit_check.get('retry_after', 60)} seconds")
+                raise RateLimitExceeded(limit_check.get("retry_after", 60))
             elif limit_check["reason"] == "monthly_limit_exceeded":
                 raise ValueError(f"Monthly email limit exceeded. Sent: {limit_check['emails_sent']}, Limit: {limit_check['limit']}")
             else:
                 raise ValueError("Email sending not allowed")
         
-        # Get user and check plan limits
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        # Get user and check plan limits; the Sent mailbox comes back on the
+        # same row through an outer join, leaving user.mailboxes untouched
+        row = db.query(User, Mailbox).outerjoin(
+            Mailbox,
+            and_(Mailbox.user_id == User.id, Mailbox.name == "Sent")
+        ).filter(User.id == user_id).first()
+        if not row:
             raise ValueError("User not found")
+        user, sent_mailbox = row
         
         # Check if user can send emails (basic check)
         if not PlanFeatures.check_feature_access(user.plan.value, "basic_email_features"):
@@ -77,7 +115,7 @@ class EmailService:
         # Save email to database first
         sent_email = Email(
             user_id=user_id,
-            mailbox_id=self._get_or_create_sent_mailbox(user_id, db),
+            mailbox_id=self._get_or_create_sent_mailbox(user, sent_mailbox, db),
             sender=user.email,
             recipient=recipient,
             subject=subject,
@@ -91,15 +129,10 @@ class EmailService:
         db.commit()
         db.refresh(sent_email)
         
-        # Queue email sending task
+        # Queue email sending task; the worker loads the message from the database
         task = send_email_task.delay(
-            user_id=user_id,
-            recipient=recipient,
-            subject=subject,
-            body_text=body_text,
-            body_html=body_html,
-            attachments=attachments,
-            email_id=sent_email.id
+            email_id=sent_email.id,
+            attachments=attachments
         )
         
         logger.info(f"Email queued for sending from {user.email} to {recipient}, task_id: {task.id}")
@@ -138,14 +171,15 @@ class EmailService:
         
         # Simulate receiving emails (in real implementation, this would connect to IMAP)
         # For now, we'll just return existing emails from the database
-        emails = db.query(Email).filter(
+        emails = db.query(Email).options(
+            selectinload(Email.attachments)
+        ).filter(
             Email.user_id == user_id,
             Email.mailbox_id == inbox.id
         ).order_by(Email.received_at.desc()).all()
         
-        result = []
-        for email in emails:
-            email_data = {
+        return [
+            {
                 "id": email.id,
                 "sender": email.sender,
                 "recipient": email.recipient,
@@ -154,23 +188,20 @@ class EmailService:
                 "status": email.status.value,
                 "is_read": email.is_read,
                 "is_spam": email.is_spam,
-                "created_at": email.created_at.isoformat(),
-                "received_at": email.received_at.isoformat() if email.received_at else None,
-                "attachments": []
+                "created_at": _iso(email.created_at),
+                "received_at": _iso(email.received_at),
+                "attachments": [
+                    {
+                        "id": attachment.id,
+                        "filename": attachment.filename,
+                        "file_size": attachment.file_size,
+                        "content_type": attachment.content_type
+                    }
+                    for attachment in email.attachments
+                ]
             }
-            
-            # Get attachments
-            for attachment in email.attachments:
-                email_data["attachments"].append({
-                    "id": attachment.id,
-                    "filename": attachment.filename,
-                    "file_size": attachment.file_size,
-                    "content_type": attachment.content_type
-                })
-            
-            result.append(email_data)
-        
-        return result
+            for email in emails
+        ]
     
     async def create_alias(
         self,
@@ -236,7 +267,7 @@ class EmailService:
             "alias_email": new_alias.alias_email,
             "alias_name": new_alias.alias_name,
             "is_disposable": new_alias.is_disposable,
-            "expires_at": new_alias.expires_at.isoformat() if new_alias.expires_at else None
+            "expires_at": _iso(new_alias.expires_at)
         }
     
     async def delete_alias(self, user_id: int, alias_id: int, db=None) -> Dict[str, Any]:
@@ -279,46 +310,28 @@ class EmailService:
                 "alias_name": alias.alias_name,
                 "alias_email": alias.alias_email,
                 "is_disposable": alias.is_disposable,
-                "created_at": alias.created_at.isoformat(),
-                "expires_at": alias.expires_at.isoformat() if alias.expires_at else None
+                "created_at": _iso(alias.created_at),
+                "expires_at": _iso(alias.expires_at)
             })
         
         return result
     
     def _is_spam(self, email_content: str) -> bool:
         """Basic spam detection"""
-        content_lower = email_content.lower()
+        content_lower = email_content[:SPAM_SCAN_LIMIT].lower()
         
         # Check for spam keywords
-        for keyword in self.spam_keywords:
-            if keyword in content_lower:
-                return True
-        
-        # Check for suspicious patterns
-        suspicious_patterns = [
-            r'\$\d+',  # Money amounts
-            r'http://\S+',  # HTTP links
-            r'click\s+here',  # Click here
-            r'urgent',  # Urgent
-        ]
+        if next(SPAM_KEYWORD_AUTOMATON.iter(content_lower), None) is not None:
+            return True
         
-        for pattern in suspicious_patterns:
-            if re.search(pattern, content_lower):
-                return True
-        
-        return False
+        # Check for suspicious patterns in a single pass
+        return _SPAM_RE.search(content_lower) is not None
     
-    def _get_or_create_sent_mailbox(self, user_id: int, db) -> int:
+    def _get_or_create_sent_mailbox(self, user: User, sent_mailbox: Optional[Mailbox], db) -> int:
         """Get or create sent mailbox for user"""
-        sent_mailbox = db.query(Mailbox).filter(
-            Mailbox.user_id == user_id,
-            Mailbox.name == "Sent"
-        ).first()
-        
         if not sent_mailbox:
-            user = db.query(User).filter(User.id == user_id).first()
             sent_mailbox = Mailbox(
-                user_id=user_id,
+                user_id=user.id,
                 name="Sent",
                 email_address=user.email
             )
@@ -335,7 +348,7 @@ class EmailService:
         
         # Generate unique filename
         file_extension = Path(filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
+        unique_filename = f"{os.urandom(16).hex()}{file_extension}"
         file_path = self.storage_path / unique_filename
         
         # Save file
@@ -1,7 +1,30 @@
-from .email_tasks import send_email_task, receive_email_task, cleanup_expired_tokens
-from .monitoring_tasks import reset_monthly_usage, cleanup_old_logs, update_metrics
+import importlib
+
+# Task modules are imported on first attribute access so that importing a
+# single task module (or the package itself) does not pull in every worker
+# dependency at startup.
+_TASK_MODULES = {
+    "send_email_task": ".email_tasks",
+    "send_emails_bulk_task": ".email_tasks",
+    "enqueue_emails_bulk": ".email_tasks",
+    "receive_email_task": ".email_tasks",
+    "cleanup_expired_tokens": ".email_tasks",
+    "reset_monthly_usage": ".monitoring_tasks",
+    "cleanup_old_logs": ".monitoring_tasks",
+    "update_metrics": ".monitoring_tasks",
+}
 
 __all__ = [
-    "send_email_task", "receive_email_task", "cleanup_expired_tokens",
+    "send_email_task", "send_emails_bulk_task", "enqueue_emails_bulk",
+    "receive_email_task", "cleanup_expired_tokens",
     "reset_monthly_usage", "cleanup_old_logs", "update_metrics"
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name not in _TASK_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(_TASK_MODULES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
@@ -1,6 +1,7 @@
 import os
+import functools
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any
 
 from celery import current_task
@@ -10,6 +11,9 @@ from app.utils import get_logger
 
 logger = get_logger(__name__)
 
+# Rows processed per transaction when purging soft-deleted files
+CLEANUP_BATCH_SIZE = 500
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
 def scan_file_task(self, file_id: int) -> Dict[str, Any]:
     """Scan file for viruses"""
@@ -67,35 +71,9 @@ def perform_virus_scan(file_path: str) -> Dict[str, Any]:
     """
     
     try:
-        # Placeholder: Check file size and extension for basic "scanning"
-        file_size = os.path.getsize(file_size)
-        file_extension = os.path.splitext(file_path)[1].lower()
-        
-        # Basic heuristic: very large files or suspicious extensions
-        suspicious_extensions = ['.exe', '.bat', '.cmd', '.scr', '.pif', '.com']
-        
-        if file_extension in suspicious_extensions and file_size > 10 * 1024 * 1024:  # > 10MB
-            return {
-                "status": "infected",
-                "details": "Suspicious file type and size detected"
-            }
-        
-        # Simulate scan delay
-        import time
-        time.sleep(1)
-        
-        # For demonstration, randomly mark some files as infected
-        import random
-        if random.random() < 0.05:  # 5% chance of being "infected"
-            return {
-                "status": "infected",
-                "details": "Virus detected (simulated)"
-            }
-        
-        return {
-            "status": "clean",
-            "details": "No threats detected"
-        }
+        # Results are memoized per file version; any write changes mtime/size
+        stat_result = os.stat(file_path)
+        return dict(_scan_file_version(file_path, stat_result.st_mtime_ns, stat_result.st_size))
         
     except Exception as e:
         logger.error(f"Error during virus scan: {str(e)}")
@@ -104,6 +82,38 @@ def perform_virus_scan(file_path: str) -> Dict[str, Any]:
             "details": f"Scan failed: {str(e)}"
         }
 
+@functools.lru_cache(maxsize=4096)
+def _scan_file_version(file_path: str, mtime_ns: int, file_size: int) -> Dict[str, Any]:
+    """Scan a specific version of a file, identified by path, mtime and size"""
+    # Placeholder: Check file size and extension for basic "scanning"
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    # Basic heuristic: very large files or suspicious extensions
+    suspicious_extensions = ['.exe', '.bat', '.cmd', '.scr', '.pif', '.com']
+    
+    if file_extension in suspicious_extensions and file_size > 10 * 1024 * 1024:  # > 10MB
+        return {
+            "status": "infected",
+            "details": "Suspicious file type and size detected"
+        }
+    
+    # Simulate scan delay
+    import time
+    time.sleep(1)
+    
+    # For demonstration, randomly mark some files as infected
+    import random
+    if random.random() < 0.05:  # 5% chance of being "infected"
+        return {
+            "status": "infected",
+            "details": "Virus detected (simulated)"
+        }
+    
+    return {
+        "status": "clean",
+        "details": "No threats detected"
+    }
+
 @celery_app.task
 def cleanup_expired_shares() -> Dict[str, Any]:
     """Clean up expired share links"""
@@ -144,31 +154,50 @@ def cleanup_deleted_files() -> Dict[str, Any]:
     """Clean up deleted files from disk"""
     try:
         db = next(get_db())
-        from app.models import DriveFile
+        from app.models import DriveFile, DriveShare
         
         # Find deleted files older than 30 days
         cutoff_date = datetime.utcnow() - timedelta(days=30)
         
-        deleted_files = db.query(DriveFile).filter(
-            DriveFile.is_deleted == True,
-            DriveFile.updated_at < cutoff_date
-        ).all()
-        
         cleaned_count = 0
-        
-        for file_record in deleted_files:
-            try:
-                if os.path.exists(file_record.file_path):
-                    os.remove(file_record.file_path)
-                    cleaned_count += 1
-                
-                # Remove from database
-                db.delete(file_record)
-                
-            except Exception as e:
-                logger.error(f"Error deleting file {file_record.file_path}: {str(e)}")
-        
-        db.commit()
+        last_id = 0
+        
+        # Walk the backlog in id-ordered batches so memory stays flat and each
+        # batch can be committed without invalidating an open cursor
+        while True:
+            batch = db.query(DriveFile.id, DriveFile.file_path).filter(
+                DriveFile.is_deleted == True,
+                DriveFile.updated_at < cutoff_date,
+                DriveFile.id > last_id
+            ).order_by(DriveFile.id).limit(CLEANUP_BATCH_SIZE).all()
+            
+            if not batch:
+                break
+            
+            removed_ids = []
+            
+            for file_id, file_path in batch:
+                try:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                        cleaned_count += 1
+                    
+                    removed_ids.append(file_id)
+                    
+                except Exception as e:
+                    logger.error(f"Error deleting file {file_path}: {str(e)}")
+            
+            # Remove from database
+            if removed_ids:
+                db.query(DriveShare).filter(
+                    DriveShare.file_id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+                db.query(DriveFile).filter(
+                    DriveFile.id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+                db.commit()
+            
+            last_id = batch[-1].id
         
         logger.info(f"Cleaned up {cleaned_count} deleted files from disk")
         
@@ -1,114 +1,147 @@
 import os
 import uuid
+import asyncio
+import random
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
 import aiosmtplib
 import aiofiles
 
+# SIMD-accelerated base64 when available, stdlib otherwise
+try:
+    from pybase64 import encodebytes as b64_encodebytes
+except ImportError:
+    from base64 import encodebytes as b64_encodebytes
+
+from sqlalchemy.exc import IntegrityError
 from celery import current_task
+from celery.signals import worker_process_init, worker_process_shutdown
 from app.celery_app import celery_app
+from app.tasks.monitoring_tasks import record_email_metrics
 from app.models import get_db, User, Mailbox, Alias, Email, EmailAttachment, EmailStatus
 from app.utils import get_logger
 from app.config import settings
 
 logger = get_logger(__name__)
 
+# Exponential retry backoff with full jitter, so tasks that failed together
+# (e.g. during an SMTP outage) don't all retry at the same moment
+RETRY_BASE_DELAY = 60
+RETRY_BACKOFF_MAX = 3600
+
+def retry_countdown(retries: int) -> float:
+    """Pick a random retry delay within the exponential backoff window"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BASE_DELAY * (2 ** retries)))
+
+# Per-process event loop and SMTP connections, reused across tasks
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_smtp_connections: Dict[tuple, aiosmtplib.SMTP] = {}
+
+@worker_process_init.connect
+def init_worker_loop(**kwargs):
+    """Create the event loop used by email tasks in this worker process"""
+    get_worker_loop()
+
+@worker_process_shutdown.connect
+def shutdown_worker_loop(**kwargs):
+    """Close pooled SMTP connections and the worker event loop"""
+    global _worker_loop
+    
+    if _worker_loop is None or _worker_loop.is_closed():
+        return
+    
+    for smtp in list(_smtp_connections.values()):
+        if smtp.is_connected:
+            try:
+                _worker_loop.run_until_complete(smtp.quit())
+            except Exception as e:
+                logger.warning(f"Failed to close SMTP connection: {str(e)}")
+    
+    _smtp_connections.clear()
+    _worker_loop.close()
+    _worker_loop = None
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Get the worker event loop, creating it on first use"""
+    global _worker_loop
+    
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+        # Let short send coroutines run inline where supported (Python 3.12+)
+        eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+        if eager_task_factory is not None:
+            _worker_loop.set_task_factory(eager_task_factory)
+        asyncio.set_event_loop(_worker_loop)
+    
+    return _worker_loop
+
+def get_smtp_settings() -> Dict[str, Any]:
+    """Read SMTP connection settings from the environment"""
+    return {
+        "host": os.getenv("SMTP_HOST", "localhost"),
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "user": os.getenv("SMTP_USER", ""),
+        "password": os.getenv("SMTP_PASSWORD", ""),
+        "use_tls": os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+    }
+
+async def _get_smtp_connection(smtp_settings: Dict[str, Any]) -> aiosmtplib.SMTP:
+    """Get a connected SMTP client for these settings, reusing an open session"""
+    key = (smtp_settings["host"], smtp_settings["port"], smtp_settings["user"])
+    smtp = _smtp_connections.get(key)
+    
+    if smtp is None:
+        smtp = aiosmtplib.SMTP(
+            hostname=smtp_settings["host"],
+            port=smtp_settings["port"],
+            use_tls=smtp_settings["use_tls"]
+        )
+        _smtp_connections[key] = smtp
+    
+    if not smtp.is_connected:
+        await smtp.connect()
+        if smtp_settings["user"] and smtp_settings["password"]:
+            await smtp.login(smtp_settings["user"], smtp_settings["password"])
+    
+    return smtp
+
+async def _pooled_send(message, smtp_settings: Dict[str, Any]):
+    """Send a message over the pooled SMTP session, reconnecting once if it went stale"""
+    smtp = await _get_smtp_connection(smtp_settings)
+    
+    try:
+        await smtp.send_message(message)
+    except aiosmtplib.SMTPServerDisconnected:
+        smtp.close()
+        smtp = await _get_smtp_connection(smtp_settings)
+        await smtp.send_message(message)
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
 def send_email_task(
     self,
-    user_id: int,
-    recipient: str,
-    subject: str,
-    body_text: str,
-    body_html: Optional[str] = None,
-    attachments: Optional[list] = None,
-    email_id: Optional[int] = None
+    email_id: int,
+    attachments: Optional[list] = None
 ) -> Dict[str, Any]:
-    """Send email asynchronously"""
+    """Send a stored email asynchronously"""
     try:
-        logger.info(f"Starting email send task for user {user_id} to {recipient}")
+        logger.info(f"Starting email send task for email {email_id}")
         
         db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            raise ValueError(f"User {user_id} not found")
-        
-        # Check usage limits
-        if not check_email_usage_limit(user_id, db):
-            raise ValueError(f"Email usage limit exceeded for user {user_id}")
+        email = db.query(Email).filter(Email.id == email_id).first()
         
-        # Create email message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = user.email
-        message["To"] = recipient
+        if not email:
+            raise ValueError(f"Email {email_id} not found")
         
-        # Add text body
-        text_part = MIMEText(body_text, "plain")
-        message.attach(text_part)
+        user_id = email.user_id
+        recipient = email.recipient
+        user = email.user
         
-        # Add HTML body if provided
-        if body_html:
-            html_part = MIMEText(body_html, "html")
-            message.attach(html_part)
-        
-        # Add attachments if provided
-        if attachments:
-            for attachment_path in attachments:
-                if os.path.exists(attachment_path):
-                    with open(attachment_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
-                        encoders.encode_base64(part)
-                        part.add_header(
-                            "Content-Disposition",
-                            f"attachment; filename= {os.path.basename(attachment_path)}"
-                        )
-                        message.attach(part)
-        
-        # Send email via SMTP
-        smtp_host = os.getenv("SMTP_HOST", "localhost")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_user = os.getenv("SMTP_USER", "")
-        smtp_password = os.getenv("SMTP_PASSWORD", "")
-        smtp_use_tls = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
-        
-        async def send_async():
-            async with aiosmtplib.SMTP(
-                hostname=smtp_host,
-                port=smtp_port,
-                use_tls=smtp_use_tls
-            ) as smtp:
-                if smtp_user and smtp_password:
-                    await smtp.login(smtp_user, smtp_password)
-                
-                await smtp.send_message(message)
-        
-        # Run async function in sync context
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(send_async())
-        finally:
-            loop.close()
-        
-        # Update email status in database
-        if email_id:
-            email = db.query(Email).filter(Email.id == email_id).first()
-            if email:
-                email.status = EmailStatus.SENT
-                email.received_at = datetime.utcnow()
-                db.commit()
-        
-        # Update usage tracking
-        update_email_usage(user_id, db)
+        deliver_email(email, db, attachments)
+        record_email_metrics({(user.plan.value, EmailStatus.SENT.value): 1})
         
         logger.info(f"Email sent successfully from {user.email} to {recipient}")
         
@@ -124,101 +157,139 @@ def send_email_task(
         logger.error(f"Failed to send email: {str(e)}")
         
         # Update email status to failed
-        if email_id:
-            try:
-                db = next(get_db())
-                email = db.query(Email).filter(Email.id == email_id).first()
-                if email:
-                    email.status = EmailStatus.FAILED
-                    email.received_at = datetime.utcnow()
-                    db.commit()
-            except Exception as db_error:
-                logger.error(f"Failed to update email status: {db_error}")
+        try:
+            db = next(get_db())
+            email = db.query(Email).filter(Email.id == email_id).first()
+            if email:
+                email.status = EmailStatus.FAILED
+                email.received_at = datetime.utcnow()
+                db.commit()
+                
+                # Count the failure once, when no retries are left
+                if self.request.retries >= self.max_retries:
+                    record_email_metrics({(email.user.plan.value, EmailStatus.FAILED.value): 1})
+        except Exception as db_error:
+            logger.error(f"Failed to update email status: {db_error}")
         
         # Retry the task
-        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+
+@celery_app.task(bind=True)
+def send_emails_bulk_task(self, email_ids: List[int]) -> Dict[str, Any]:
+    """Send a batch of stored emails over one DB session and SMTP connection"""
+    logger.info(f"Starting bulk email send task for {len(email_ids)} emails")
+    
+    db = next(get_db())
+    smtp_settings = get_smtp_settings()
+    sent_ids = []
+    failed_ids = []
+    sent_by_plan = {}
+    
+    emails = db.query(Email).filter(Email.id.in_(email_ids)).all()
+    
+    # Ids deleted since they were queued have nothing left to send
+    missing_ids = sorted(set(email_ids) - {email.id for email in emails})
+    if missing_ids:
+        logger.warning(f"Skipping {len(missing_ids)} emails no longer in the database: {missing_ids}")
+    
+    for email in emails:
+        try:
+            deliver_email(email, db, smtp_settings=smtp_settings)
+            sent_ids.append(email.id)
+            metric_key = (email.user.plan.value, EmailStatus.SENT.value)
+            sent_by_plan[metric_key] = sent_by_plan.get(metric_key, 0) + 1
+        except Exception as e:
+            logger.error(f"Failed to send email {email.id} in bulk: {str(e)}")
+            db.rollback()
+            failed_ids.append(email.id)
+    
+    # One counter update per plan for the whole batch
+    if sent_by_plan:
+        record_email_metrics(sent_by_plan)
+    
+    # Hand failures to the single-email task so they get its retry policy
+    for email_id in failed_ids:
+        send_email_task.apply_async(kwargs={"email_id": email_id}, countdown=retry_countdown(0))
+    
+    logger.info(f"Bulk send finished: {len(sent_ids)} sent, {len(failed_ids)} requeued")
+    
+    return {
+        "success": not failed_ids,
+        "message": f"Sent {len(sent_ids)} emails, requeued {len(failed_ids)}",
+        "task_id": current_task.request.id,
+        "sent_ids": sent_ids,
+        "requeued_ids": failed_ids,
+        "missing_ids": missing_ids
+    }
+
+# Entry point for fan-out sends. EmailService.send_email queues one message
+# per request, so nothing calls this yet; a bulk send API would.
+def enqueue_emails_bulk(email_ids: List[int], chunk_size: int = 100) -> list:
+    """Queue stored emails for sending in chunks, publishing over one producer connection"""
+    chunks = [email_ids[i:i + chunk_size] for i in range(0, len(email_ids), chunk_size)]
+    
+    with celery_app.producer_or_acquire() as producer:
+        return [
+            send_emails_bulk_task.apply_async(args=(chunk,), producer=producer)
+            for chunk in chunks
+        ]
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
-async def receive_email_task(self, user_id: int) -> Dict[str, Any]:
+def receive_email_task(self, user_id: int) -> Dict[str, Any]:
     """Receive emails asynchronously"""
     try:
-        logger.info(f"Starting email receive task for user {user_id}")
-        
-        db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            raise ValueError(f"User {user_id} not found")
-        
-        # Simulate email receiving (in real implementation, this would connect to IMAP)
-        # For now, we'll just return existing emails from database
-        db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            raise ValueError(f"User {user_id} not found")
-        
-        # Get user's inbox
-        inbox = db.query(Mailbox).filter(
-            Mailbox.user_id == user_id,
-            Mailbox.name == "Inbox"
-        ).first()
-        
-        if not inbox:
-            inbox = Mailbox(
-                user_id=user_id,
-                name="Inbox",
-                email_address=user.email
-            )
-            db.add(inbox)
-            db.commit()
-        
-        # Get existing emails from database
-        emails = db.query(Email).filter(
-            Email.user_id == user_id,
-            Email.mailbox_id == inbox.id
-        ).order_by(Email.received_at.desc()).all()
-        
-        result = []
-        for email in emails:
-            email_data = {
-                "id": email.id,
-                "sender": email.sender,
-                "recipient": email.recipient,
-                "subject": email.subject,
-                "body_text": email.body_text,
-                "status": email.status.value,
-                "is_read": email.is_read,
-                "is_spam": email.is_spam,
-                "created_at": email.created_at.isoformat(),
-                "received_at": email.received_at.isoformat() if email.received_at else None,
-                "attachments": []
-            }
-            
-            # Get attachments
-            for attachment in email.attachments:
-                email_data["attachments"].append({
-                    "id": attachment.id,
-                    "filename": attachment.filename,
-                    "file_size": attachment.file_size,
-                    "content_type": attachment.content_type
-                })
-            
-            result.append(email_data)
-        
-        logger.info(f"Received {len(emails)} emails for user {user_id}")
-        
-        return {
-            "success": True,
-            "message": f"Received {len(emails)} emails",
-            "task_id": current_task.request.id,
-            "user_id": user_id,
-            "email_count": len(emails)
-        }
+        return get_worker_loop().run_until_complete(_receive_emails(user_id))
         
     except Exception as e:
         logger.error(f"Failed to receive emails: {str(e)}")
-        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+
+async def _receive_emails(user_id: int) -> Dict[str, Any]:
+    """Load a user's inbox; runs on the worker's event loop"""
+    logger.info(f"Starting email receive task for user {user_id}")
+    
+    db = next(get_db())
+    user = db.query(User).filter(User.id == user_id).first()
+    
+    if not user:
+        raise ValueError(f"User {user_id} not found")
+    
+    # Simulate email receiving (in real implementation, this would connect to IMAP)
+    # For now, we'll just return existing emails from database
+    
+    # Get user's inbox
+    inbox = db.query(Mailbox).filter(
+        Mailbox.user_id == user_id,
+        Mailbox.name == "Inbox"
+    ).first()
+    
+    if not inbox:
+        inbox = Mailbox(
+            user_id=user_id,
+            name="Inbox",
+            email_address=user.email
+        )
+        db.add(inbox)
+        db.commit()
+    
+    # Only ids go into the task result, which is stored in the result backend
+    email_ids = [
+        email_id for (email_id,) in db.query(Email.id).filter(
+            Email.user_id == user_id,
+            Email.mailbox_id == inbox.id
+        ).order_by(Email.received_at.desc())
+    ]
+    
+    logger.info(f"Received {len(email_ids)} emails for user {user_id}")
+    
+    return {
+        "success": True,
+        "message": f"Received {len(email_ids)} emails",
+        "task_id": current_task.request.id,
+        "user_id": user_id,
+        "email_count": len(email_ids),
+        "email_ids": email_ids
+    }
 
 @celery_app.task
 def cleanup_expired_tokens() -> Dict[str, Any]:
@@ -229,29 +300,22 @@ def cleanup_expired_tokens() -> Dict[str, Any]:
         
         now = datetime.utcnow()
         
-        # Clean up expired email verification tokens
-        expired_email_tokens = db.query(EmailVerificationToken).filter(
+        # Clean up expired tokens with one DELETE per table
+        email_token_count = db.query(EmailVerificationToken).filter(
             EmailVerificationToken.expires_at < now
-        ).all()
+        ).delete(synchronize_session=False)
         
-        for token in expired_email_tokens:
-            db.delete(token)
-        
-        # Clean up expired password reset tokens
-        expired_password_tokens = db.query(PasswordResetToken).filter(
+        password_token_count = db.query(PasswordResetToken).filter(
             PasswordResetToken.expires_at < now
-        ).all()
-        
-        for token in expired_password_tokens:
-            db.delete(token)
+        ).delete(synchronize_session=False)
         
         db.commit()
         
-        logger.info(f"Cleaned up {len(expired_email_tokens)} email tokens and {len(expired_password_tokens)} password tokens")
+        logger.info(f"Cleaned up {email_token_count} email tokens and {password_token_count} password tokens")
         
         return {
             "success": True,
-            "message": f"Cleaned up {len(expired_email_tokens)} email tokens and {len(expired_password_tokens)} password tokens"
+            "message": f"Cleaned up {email_token_count} email tokens and {password_token_count} password tokens"
         }
         
     except Exception as e:
@@ -261,6 +325,69 @@ def cleanup_expired_tokens() -> Dict[str, Any]:
             "message": f"Failed to cleanup tokens: {str(e)}"
         }
 
+def encode_attachment(file_path: str) -> str:
+    """Base64-encode a file into RFC 2045 76-character lines"""
+    with open(file_path, "rb") as attachment:
+        return b64_encodebytes(attachment.read()).decode("ascii")
+
+def build_email_message(email: Email, attachments: Optional[list] = None) -> MIMEMultipart:
+    """Build the MIME message for a stored email"""
+    message = MIMEMultipart("alternative")
+    message["Subject"] = email.subject
+    message["From"] = email.user.email
+    message["To"] = email.recipient
+    
+    # Add text body
+    text_part = MIMEText(email.body_text or "", "plain")
+    message.attach(text_part)
+    
+    # Add HTML body if provided
+    if email.body_html:
+        html_part = MIMEText(email.body_html, "html")
+        message.attach(html_part)
+    
+    # Add attachments if provided
+    if attachments:
+        for attachment_path in attachments:
+            if os.path.exists(attachment_path):
+                part = MIMEBase("application", "octet-stream")
+                part.set_payload(encode_attachment(attachment_path))
+                part["Content-Transfer-Encoding"] = "base64"
+                part.add_header(
+                    "Content-Disposition",
+                    f"attachment; filename= {os.path.basename(attachment_path)}"
+                )
+                message.attach(part)
+    
+    return message
+
+def deliver_email(email: Email, db, attachments: Optional[list] = None, smtp_settings: Optional[Dict[str, Any]] = None):
+    """Send a stored email over the pooled SMTP connection and record the result"""
+    if not email.user:
+        raise ValueError(f"User {email.user_id} not found")
+    
+    # Check usage limits
+    if not check_email_usage_limit(email.user_id, db):
+        raise ValueError(f"Email usage limit exceeded for user {email.user_id}")
+    
+    message = build_email_message(email, attachments)
+    
+    # Send email via the worker's pooled SMTP connection
+    get_worker_loop().run_until_complete(_pooled_send(message, smtp_settings or get_smtp_settings()))
+    
+    # Update email status in database
+    email.status = EmailStatus.SENT
+    email.received_at = datetime.utcnow()
+    db.commit()
+    
+    # The message is already out, so a usage tracking failure is only logged;
+    # raising here would make callers retry and send it again
+    try:
+        update_email_usage(email.user_id, db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to update email usage for email {email.id}: {str(e)}")
+
 def check_email_usage_limit(user_id: int, db) -> bool:
     """Check if user has exceeded email usage limit"""
     from app.models import UserUsage
@@ -288,32 +415,35 @@ def check_email_usage_limit(user_id: int, db) -> bool:
     
     # Check plan limits
     from app.plans import PlanFeatures
-    plan_features = PlanFeatures.get_plan_features(user.plan.value)
-    
-    if user.plan.value == "enterprise":
-        return True  # Unlimited for enterprise
-    
-    max_emails = plan_features.get("max_emails_per_month", 300)
-    return usage.emails_sent < max_emails
+    return PlanFeatures.check_email_monthly_limit(user.plan.value, usage.emails_sent)
 
 def update_email_usage(user_id: int, db):
     """Update email usage tracking"""
     from app.models import UserUsage
     
-    # Get or create usage record
-    usage = db.query(UserUsage).filter(
+    current_month = datetime.utcnow().strftime("%Y-%m")
+    
+    # Increment in the database so concurrent sends can't lose an update
+    updated = db.query(UserUsage).filter(
         UserUsage.user_id == user_id,
-        UserUsage.month == datetime.utcnow().strftime("%Y-%m")
-    ).first()
+        UserUsage.month == current_month
+    ).update({UserUsage.emails_sent: UserUsage.emails_sent + 1}, synchronize_session=False)
     
-    if not usage:
-        usage = UserUsage(
+    if not updated:
+        db.add(UserUsage(
             user_id=user_id,
-            month=datetime.utcnow().strftime("%Y-%m"),
-            emails_sent=0,
+            month=current_month,
+            emails_sent=1,
             emails_received=0
-        )
-        db.add(usage)
+        ))
     
-    usage.emails_sent += 1
-    db.commit()
\ No newline at end of file
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another send created this month's row first
+        db.rollback()
+        db.query(UserUsage).filter(
+            UserUsage.user_id == user_id,
+            UserUsage.month == current_month
+        ).update({UserUsage.emails_sent: UserUsage.emails_sent + 1}, synchronize_session=False)
+        db.commit()
\ No newline at end of file
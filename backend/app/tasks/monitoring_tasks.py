@@ -1,21 +1,27 @@
 import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 import redis
+from sqlalchemy import update
 
 from app.celery_app import celery_app
-from app.models import get_db, User, UserUsage
+from app.models import get_db, User, UserUsage, UserPlan, EmailStatus
+from app.plans import PlanFeatures
 from app.utils import get_logger
 
 logger = get_logger(__name__)
 
 # Prometheus metrics
-EMAILS_SENT_COUNTER = Counter('oxlas_emails_sent_total', 'Total emails sent', ['plan', 'status'])
+EMAILS_SENT_COUNTER = Counter('oxlas_emails_sent_total', 'Total emails sent or failed', ['plan', 'status'])
 EMAILS_RECEIVED_COUNTER = Counter('oxlas_emails_received_total', 'Total emails received', ['plan'])
 ACTIVE_USERS_GAUGE = Gauge('oxlas_active_users', 'Number of active users')
+EMAILS_MONTH_GAUGE = Gauge('oxlas_emails_current_month', 'Emails sent or failed in the current month', ['plan', 'status'])
 QUEUE_LATENCY_HISTOGRAM = Histogram('oxlas_queue_latency_seconds', 'Task queue latency')
 FAILED_JOBS_COUNTER = Counter('oxlas_failed_jobs_total', 'Total failed jobs', ['task_type'])
+QUEUE_LENGTH_GAUGE = Gauge('oxlas_queue_length', 'Tasks waiting in the celery queue')
 
 # Redis client for rate limiting
 redis_client = redis.Redis(
@@ -25,6 +31,70 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Monthly email outcome counters per plan, kept in Redis by the send tasks
+# so metric updates don't have to scan the emails table
+EMAIL_METRICS_KEY_PREFIX = "metrics:emails"
+EMAIL_METRICS_TTL_SECONDS = 62 * 24 * 60 * 60
+EMAIL_METRIC_STATUSES = (EmailStatus.SENT, EmailStatus.FAILED)
+
+# Per-minute request limits come from the plan table
+RATE_LIMIT_WINDOW_SECONDS = 60
+# Buckets idle for a full window are back at capacity and can expire
+RATE_LIMIT_KEY_TTL_MS = (RATE_LIMIT_WINDOW_SECONDS + 5) * 1000
+
+# Token bucket kept in a Redis hash. Refill, check and take run as one
+# script, so concurrent requests can't both spend the same token.
+# KEYS[1] = bucket, ARGV = capacity, refill per second, now (ms), cost, ttl (ms)
+# Returns 0 when the request is allowed, otherwise the ms until it would be
+RATE_LIMIT_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+local tokens = tonumber(state[1]) or capacity
+local last = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate / 1000)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+return wait
+"""
+_rate_limit_script = redis_client.register_script(RATE_LIMIT_SCRIPT)
+
+# In-process cache of user plans so rate limit checks skip the database
+PLAN_CACHE_TTL_SECONDS = 60
+PLAN_CACHE_MAX_SIZE = 50000
+_plan_cache: Dict[int, Tuple[str, float]] = {}
+
+# Per-process token buckets, (user_id, action) -> (tokens, last refill).
+# Tokens are only kept for requests Redis also allowed (refusals are
+# refunded), so this process's spend never exceeds the shared spend. A
+# process that has spent a user's whole allowance can therefore refuse
+# further requests without asking Redis.
+_token_buckets: Dict[Tuple[int, str], Tuple[float, float]] = {}
+_token_buckets_lock = threading.Lock()
+
+# Users the shared bucket has refused, (user_id, action) -> monotonic time
+# the next token is due. Until then the answer can only be no, so repeat
+# attempts are refused without a round trip.
+_rate_limited_until: Dict[Tuple[int, str], float] = {}
+
+# Rendered Prometheus output is reused for a short time, so concurrent
+# scrapes (e.g. HA Prometheus pairs) only format the registry once
+PROMETHEUS_CACHE_TTL_SECONDS = 1.0
+_prometheus_cache: Tuple[float, bytes] = (0.0, b"")
+_prometheus_cache_lock = threading.Lock()
+
+# Last queue length probe, reused so frequent polling doesn't hit Redis each time
+QUEUE_METRICS_TTL_SECONDS = 5.0
+_queue_metrics_cache: Tuple[float, Dict[str, Any]] = (0.0, {})
+
 @celery_app.task
 def reset_monthly_usage() -> Dict[str, Any]:
     """Reset monthly usage counters for all users"""
@@ -34,23 +104,14 @@ def reset_monthly_usage() -> Dict[str, Any]:
         # Get current month
         current_month = datetime.utcnow().strftime("%Y-%m")
         
-        # Reset usage for all users
-        users = db.query(User).all()
-        reset_count = 0
-        
-        for user in users:
-            # Check if usage record exists for current month
-            usage = db.query(UserUsage).filter(
-                UserUsage.user_id == user.id,
-                UserUsage.month == current_month
-            ).first()
-            
-            if usage:
-                usage.emails_sent = 0
-                usage.emails_received = 0
-                reset_count += 1
-        
+        # Reset usage for all users in a single statement
+        result = db.execute(
+            update(UserUsage)
+            .where(UserUsage.month == current_month)
+            .values(emails_sent=0, emails_received=0)
+        )
         db.commit()
+        reset_count = result.rowcount
         
         logger.info(f"Reset monthly usage for {reset_count} users")
         
@@ -71,21 +132,20 @@ def reset_monthly_usage() -> Dict[str, Any]:
 def cleanup_old_logs() -> Dict[str, Any]:
     """Clean up old log files"""
     try:
-        import shutil
-        from pathlib import Path
-        
-        logs_dir = Path("logs")
-        if not logs_dir.exists():
+        logs_dir = "logs"
+        if not os.path.isdir(logs_dir):
             return {"success": True, "message": "No logs directory found"}
         
         # Remove logs older than 90 days
-        cutoff_date = datetime.utcnow() - timedelta(days=90)
+        cutoff = (datetime.utcnow() - timedelta(days=90)).timestamp()
         removed_count = 0
         
-        for log_file in logs_dir.glob("*.log*"):
-            if log_file.stat().st_mtime < cutoff_date.timestamp():
-                log_file.unlink()
-                removed_count += 1
+        # scandir entries carry their own stat, so no extra path objects or lookups per file
+        with os.scandir(logs_dir) as entries:
+            for entry in entries:
+                if ".log" in entry.name and entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed_count += 1
         
         logger.info(f"Cleaned up {removed_count} old log files")
         
@@ -102,6 +162,24 @@ def cleanup_old_logs() -> Dict[str, Any]:
             "message": f"Failed to cleanup old logs: {str(e)}"
         }
 
+def _email_metrics_key() -> str:
+    return f"{EMAIL_METRICS_KEY_PREFIX}:{datetime.utcnow().strftime('%Y-%m')}"
+
+def record_email_metrics(counts: Dict[Tuple[str, str], int]) -> None:
+    """Count email outcomes, keyed by (plan, status), in Prometheus and this month's counters"""
+    for (plan, email_status), count in counts.items():
+        EMAILS_SENT_COUNTER.labels(plan=plan, status=email_status).inc(count)
+    
+    try:
+        key = _email_metrics_key()
+        pipe = redis_client.pipeline(transaction=False)
+        for (plan, email_status), count in counts.items():
+            pipe.hincrby(key, f"{plan}:{email_status}", count)
+        pipe.expire(key, EMAIL_METRICS_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to record email metrics: {str(e)}")
+
 @celery_app.task
 def update_metrics() -> Dict[str, Any]:
     """Update Prometheus metrics"""
@@ -112,28 +190,20 @@ def update_metrics() -> Dict[str, Any]:
         active_users = db.query(User).filter(User.is_active == True).count()
         ACTIVE_USERS_GAUGE.set(active_users)
         
-        # Get email statistics by plan
-        from app.models import Email, EmailStatus
-        
-        plans = ["free", "pro", "enterprise"]
-        for plan in plans:
-            # Sent emails
-            sent_count = db.query(Email).join(User).filter(
-                User.plan == plan,
-                Email.status == EmailStatus.SENT,
-                Email.created_at >= datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            ).count()
-            
-            EMAILS_SENT_COUNTER.labels(plan=plan, status="sent").inc(sent_count)
-            
-            # Failed emails
-            failed_count = db.query(Email).join(User).filter(
-                User.plan == plan,
-                Email.status == EmailStatus.FAILED,
-                Email.created_at >= datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            ).count()
-            
-            EMAILS_SENT_COUNTER.labels(plan=plan, status="failed").inc(failed_count)
+        # Email statistics come from the Redis counters kept by the send tasks
+        email_counts = {
+            (plan.value, status.value): 0
+            for plan in UserPlan
+            for status in EMAIL_METRIC_STATUSES
+        }
+        
+        for field, count in redis_client.hgetall(_email_metrics_key()).items():
+            plan, email_status = field.split(":", 1)
+            email_counts[(plan, email_status)] = int(count)
+        
+        # Gauges are set to absolute values, so repeated runs don't double count
+        for (plan, email_status), count in email_counts.items():
+            EMAILS_MONTH_GAUGE.labels(plan=plan, status=email_status).set(count)
         
         logger.info("Metrics updated successfully")
         
@@ -150,66 +220,129 @@ def update_metrics() -> Dict[str, Any]:
             "message": f"Failed to update metrics: {str(e)}"
         }
 
+def get_user_plan(user_id: int) -> Optional[str]:
+    """Get a user's plan, cached for a short time"""
+    now = time.monotonic()
+    cached = _plan_cache.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    
+    db = next(get_db())
+    plan = db.query(User.plan).filter(User.id == user_id).scalar()
+    if plan is None:
+        return None
+    
+    if len(_plan_cache) >= PLAN_CACHE_MAX_SIZE:
+        _plan_cache.clear()
+    _plan_cache[user_id] = (plan.value, now + PLAN_CACHE_TTL_SECONDS)
+    return plan.value
+
+def _take_local_token(user_id: int, action: str, capacity: int) -> bool:
+    """Take a token from this process's bucket for the user, refilling it first"""
+    now = time.monotonic()
+    refill_rate = capacity / RATE_LIMIT_WINDOW_SECONDS
+    key = (user_id, action)
+    
+    with _token_buckets_lock:
+        tokens, last = _token_buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        
+        if key not in _token_buckets and len(_token_buckets) >= PLAN_CACHE_MAX_SIZE:
+            _token_buckets.clear()
+        _token_buckets[key] = (tokens, now)
+    
+    return allowed
+
+def _refund_local_token(user_id: int, action: str, capacity: int) -> None:
+    """Give back a token taken for a request the shared bucket refused"""
+    key = (user_id, action)
+    
+    with _token_buckets_lock:
+        if key in _token_buckets:
+            tokens, last = _token_buckets[key]
+            _token_buckets[key] = (min(capacity, tokens + 1), last)
+
 def check_rate_limit(user_id: int, action: str = "email") -> bool:
     """Check if user has exceeded rate limit"""
     try:
-        # Get user's plan
-        db = next(get_db())
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return False
-        
-        # Get rate limits by plan
-        rate_limits = {
-            "free": {"email": 5},      # 5 emails per minute
-            "pro": {"email": 20},      # 20 emails per minute
-            "enterprise": {"email": 100}  # 100 emails per minute
-        }
+        key = (user_id, action)
+        limited_until = _rate_limited_until.get(key)
+        if limited_until is not None:
+            if time.monotonic() < limited_until:
+                return False
+            _rate_limited_until.pop(key, None)
         
-        limit = rate_limits.get(user.plan.value, rate_limits["free"])
-        limit_key = f"rate_limit:{user_id}:{action}"
+        plan = get_user_plan(user_id)
+        if plan is None:
+            return False
         
-        # Check current count
-        current_count = redis_client.get(limit_key)
-        if current_count is None:
-            redis_client.setex(limit_key, 60, 1)  # 1 minute window
-            return True
+        limit = PlanFeatures.check_email_rate_limit(plan)
+        if not _take_local_token(user_id, action, limit):
+            return False
         
-        current_count = int(current_count)
-        if current_count >= limit:
+        bucket_key = f"rl:{user_id}:{action}"
+        wait_ms = _rate_limit_script(
+            keys=[bucket_key],
+            args=[limit, limit / RATE_LIMIT_WINDOW_SECONDS, int(time.time() * 1000), 1, RATE_LIMIT_KEY_TTL_MS]
+        )
+        if wait_ms:
+            _refund_local_token(user_id, action, limit)
+            if len(_rate_limited_until) >= PLAN_CACHE_MAX_SIZE:
+                _rate_limited_until.clear()
+            _rate_limited_until[key] = time.monotonic() + wait_ms / 1000
             return False
         
-        # Increment count
-        redis_client.incr(limit_key)
         return True
         
     except Exception as e:
         logger.error(f"Rate limit check failed: {str(e)}")
         return True  # Allow on error
 
+def _reset_rate_limit_state() -> None:
+    """Forget cached plans, local buckets and refusals (used by tests)"""
+    _plan_cache.clear()
+    with _token_buckets_lock:
+        _token_buckets.clear()
+    _rate_limited_until.clear()
+
 def get_queue_metrics() -> Dict[str, Any]:
     """Get queue metrics for monitoring"""
+    global _queue_metrics_cache
+    now = time.monotonic()
+    expires_at, metrics = _queue_metrics_cache
+    if now < expires_at:
+        return metrics
+    
     try:
-        from celery.events.state import State
-        from celery.events import EventReceiver
-        import socket
-        
         # Connect to Redis to get queue stats
         queue_length = redis_client.llen("celery")
         
-        return {
-            "queue_length": queue_length,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
     except Exception as e:
         logger.error(f"Failed to get queue metrics: {str(e)}")
         return {"queue_length": 0, "timestamp": datetime.utcnow().isoformat()}
+    
+    QUEUE_LENGTH_GAUGE.set(queue_length)
+    metrics = {
+        "queue_length": queue_length,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    _queue_metrics_cache = (now + QUEUE_METRICS_TTL_SECONDS, metrics)
+    return metrics
 
-def get_prometheus_metrics() -> str:
+def get_prometheus_metrics() -> bytes:
     """Get Prometheus metrics in text format"""
+    global _prometheus_cache
     try:
-        return generate_latest().decode('utf-8')
+        with _prometheus_cache_lock:
+            now = time.monotonic()
+            expires_at, output = _prometheus_cache
+            if now >= expires_at:
+                output = generate_latest()
+                _prometheus_cache = (now + PROMETHEUS_CACHE_TTL_SECONDS, output)
+            return output
     except Exception as e:
         logger.error(f"Failed to generate Prometheus metrics: {str(e)}")
-        return ""
\ No newline at end of file
+        return b""
\ No newline at end of file
@@ -1,18 +1,111 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-import uuid
+import base64
+import calendar
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+import orjson
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from app.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cost 12 by default for stored hashes; repeated checks of the same credential
+# are served from the verification cache below instead of lowering the cost.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# Successful bcrypt checks keyed by hash. Only a keyed digest of the password
+# is kept (never the plaintext) and only matches are cached, so a wrong
+# password always pays the full bcrypt cost. The lock covers the cache's
+# reorder and evict steps; bcrypt itself runs outside it.
+PASSWORD_CACHE_SIZE = 10000
+_password_cache_key = os.urandom(32)
+_verified_passwords: "OrderedDict[str, bytes]" = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+
+# HS256 signing state: the keyed HMAC is set up once and copied per token,
+# and the constant header segment is serialized once.
+_hmac_template = hmac.new(settings.JWT_SECRET.encode(), digestmod=hashlib.sha256)
+_JWT_HEADER_SEGMENT = base64.urlsafe_b64encode(
+    orjson.dumps({"alg": "HS256", "typ": "JWT"})
+).rstrip(b"=")
+
+# Decoded JWT payloads are reused within a short time window
+TOKEN_CACHE_WINDOW_SECONDS = 30
+
+
+def _password_digest(plain_password: str) -> bytes:
+    return hmac.new(_password_cache_key, plain_password.encode(), hashlib.sha256).digest()
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _encode_token(claims: dict) -> str:
+    """Sign claims as an HS256 JWT"""
+    if settings.JWT_ALGORITHM != "HS256":
+        return jwt.encode(claims, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    
+    for claim in ("exp", "iat", "nbf"):
+        value = claims.get(claim)
+        if isinstance(value, datetime):
+            claims[claim] = calendar.timegm(value.utctimetuple())
+    
+    payload = orjson.dumps(claims)
+    signing_input = _JWT_HEADER_SEGMENT + b"." + _b64url(payload)
+    signer = _hmac_template.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode("ascii")
+
+
+@lru_cache(maxsize=10000)
+def _decode_token_cached(token: str, window: int) -> dict:
+    return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+
+
+def _decode_token(token: str) -> dict:
+    """Decode a JWT, reusing the payload for repeated tokens in the same window"""
+    now = time.time()
+    payload = _decode_token_cached(token, int(now // TOKEN_CACHE_WINDOW_SECONDS))
+    
+    # A cached payload may outlive its token inside the window
+    exp = payload.get("exp")
+    if exp is not None and exp <= now:
+        raise JWTError("Signature has expired.")
+    
+    return dict(payload)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class AuthManager:
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
-        return pwd_context.verify(plain_password, hashed_password)
+        digest = _password_digest(plain_password)
+        with _verified_passwords_lock:
+            cached = _verified_passwords.get(hashed_password)
+            if cached is not None and hmac.compare_digest(cached, digest):
+                _verified_passwords.move_to_end(hashed_password)
+                return True
+        
+        if not pwd_context.verify(plain_password, hashed_password):
+            return False
+        
+        with _verified_passwords_lock:
+            _verified_passwords[hashed_password] = digest
+            _verified_passwords.move_to_end(hashed_password)
+            if len(_verified_passwords) > PASSWORD_CACHE_SIZE:
+                _verified_passwords.popitem(last=False)
+        return True
     
     @staticmethod
     def get_password_hash(password: str) -> str:
@@ -29,7 +122,7 @@ class AuthManager:
             expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire, "type": "access"})
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        encoded_jwt = _encode_token(to_encode)
         return encoded_jwt
     
     @staticmethod
@@ -38,41 +131,32 @@ class AuthManager:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
         to_encode.update({"exp": expire, "type": "refresh"})
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        encoded_jwt = _encode_token(to_encode)
         return encoded_jwt
     
     @staticmethod
     def create_email_verification_token(email: str) -> str:
         """Create email verification token"""
-        from app.utils import get_logger
-        logger = get_logger(__name__)
-        
         expire = datetime.utcnow() + timedelta(hours=24)  # 24 hour expiry
-        to_encode = {"sub": email, "exp": expire, "type": "email_verification", "jti": str(uuid.uuid4())}
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        to_encode = {"sub": email, "exp": expire, "type": "email_verification", "jti": secrets.token_urlsafe(16)}
+        encoded_jwt = _encode_token(to_encode)
         logger.info(f"Created email verification token for {email}")
         return encoded_jwt
     
     @staticmethod
     def create_password_reset_token(email: str) -> str:
         """Create password reset token"""
-        from app.utils import get_logger
-        logger = get_logger(__name__)
-        
         expire = datetime.utcnow() + timedelta(hours=1)  # 1 hour expiry
-        to_encode = {"sub": email, "exp": expire, "type": "password_reset", "jti": str(uuid.uuid4())}
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        to_encode = {"sub": email, "exp": expire, "type": "password_reset", "jti": secrets.token_urlsafe(16)}
+        encoded_jwt = _encode_token(to_encode)
         logger.info(f"Created password reset token for {email}")
         return encoded_jwt
     
     @staticmethod
     def verify_token(token: str, token_type: str = "access") -> dict:
         """Verify JWT token and return payload"""
-        from app.utils import get_logger
-        logger = get_logger(__name__)
-        
         try:
-            payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+            payload = _decode_token(token)
             
             if payload.get("type") != token_type:
                 logger.warning(f"Invalid token type. Expected: {token_type}, Got: {payload.get('type')}")
@@ -102,9 +186,6 @@ class AuthManager:
     @staticmethod
     def create_tokens(email: str) -> dict:
         """Create both access and refresh tokens"""
-        from app.utils import get_logger
-        logger = get_logger(__name__)
-        
         access_token = AuthManager.create_access_token(data={"sub": email})
         refresh_token = AuthManager.create_refresh_token(data={"sub": email})
         
@@ -7,34 +7,25 @@ class Logger:
         # Remove default handler
         logger.remove()
         
-        # Console handler
+        # Console handler, colorized only for interactive terminals
         logger.add(
             sys.stdout,
             format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
             level="INFO" if not settings.DEBUG else "DEBUG",
-            colorize=True
+            colorize=sys.stdout.isatty()
         )
         
-        # File handler
+        # File handler: one structured JSON sink, written from a background
+        # thread so callers don't wait on disk. Errors are filtered by level
+        # downstream instead of being written twice.
         logger.add(
             "logs/oxlas.log",
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
             level="INFO",
             rotation="10 MB",
             retention="30 days",
             compression="zip",
-            serialize=False
-        )
-        
-        # Error file handler
-        logger.add(
-            "logs/oxlas_errors.log",
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-            level="ERROR",
-            rotation="10 MB",
-            retention="90 days",
-            compression="zip",
-            serialize=False
+            serialize=True,
+            enqueue=True
         )
     
     def get_logger(self, name: str = None):
@@ -1,7 +1,22 @@
-import json
+import orjson
 from fastapi.openapi.utils import get_openapi
 from app.main import app
 
+BASE_URL = "http://localhost:8000"
+
+# Headers every request in the exported collection starts with; each
+# request gets its own copies, so editing one leaves the others alone
+_DEFAULT_HEADERS = (
+    {
+        "key": "Content-Type",
+        "value": "application/json"
+    },
+    {
+        "key": "Authorization",
+        "value": "Bearer YOUR_TOKEN_HERE"
+    }
+)
+
 def export_openapi_schema():
     """Export OpenAPI schema to JSON file"""
     openapi_schema = get_openapi(
@@ -12,15 +27,15 @@ def export_openapi_schema():
     )
     
     # Save to file
-    with open("docs/openapi_schema.json", "w") as f:
-        json.dump(openapi_schema, f, indent=2)
+    with open("docs/openapi_schema.json", "wb") as f:
+        f.write(orjson.dumps(openapi_schema, option=orjson.OPT_INDENT_2))
     
     # Convert to Postman collection
     postman_collection = convert_to_postman(openapi_schema)
     
     # Save Postman collection
-    with open("docs/postman/oxlas_suite_postman.json", "w") as f:
-        json.dump(postman_collection, f, indent=2)
+    with open("docs/postman/oxlas_suite_postman.json", "wb") as f:
+        f.write(orjson.dumps(postman_collection, option=orjson.OPT_INDENT_2))
     
     print("OpenAPI schema and Postman collection exported successfully")
 
@@ -35,11 +50,20 @@ def convert_to_postman(openapi_schema):
         "item": []
     }
     
+    # Component schemas are resolved once and their examples shared across endpoints
+    components = openapi_schema.get("components", {}).get("schemas", {})
+    example_cache = {}
+    
     # Group endpoints by tags
     endpoints_by_tag = {}
     
     for path, methods in openapi_schema["paths"].items():
+        # Work that only depends on the path is done once for all its methods
+        path_parts = path.strip("/").split("/")
+        raw_url = BASE_URL + path
+        
         for method, details in methods.items():
+            method_name = method.upper()
             tags = details.get("tags", ["default"])
             tag = tags[0] if tags else "default"
             
@@ -47,34 +71,26 @@ def convert_to_postman(openapi_schema):
                 endpoints_by_tag[tag] = []
             
             endpoint = {
-                "name": details.get("summary", f"{method.upper()} {path}"),
+                "name": details.get("summary", f"{method_name} {path}"),
                 "request": {
-                    "method": method.upper(),
-                    "header": [
-                        {
-                            "key": "Content-Type",
-                            "value": "application/json"
-                        },
-                        {
-                            "key": "Authorization",
-                            "value": "Bearer YOUR_TOKEN_HERE"
-                        }
-                    ],
+                    "method": method_name,
+                    "header": [dict(header) for header in _DEFAULT_HEADERS],
                     "url": {
-                        "raw": "http://localhost:8000" + path,
+                        "raw": raw_url,
                         "protocol": "http",
                         "host": ["localhost", "8000"],
-                        "path": path.strip("/").split("/")
+                        "path": list(path_parts)
                     }
                 }
             }
             
             # Add request body if present
-            if "requestBody" in details:
-                schema = details["requestBody"]["content"]["application/json"]["schema"]
+            request_content = details.get("requestBody", {}).get("content", {})
+            if "application/json" in request_content:
+                schema = request_content["application/json"]["schema"]
                 endpoint["request"]["body"] = {
                     "mode": "raw",
-                    "raw": json.dumps(get_example_from_schema(schema)),
+                    "raw": orjson.dumps(get_example_from_schema(schema, components, example_cache)).decode(),
                     "options": {
                         "raw": {
                             "language": "json"
@@ -104,23 +120,31 @@ def convert_to_postman(openapi_schema):
     
     return postman_collection
 
-def get_example_from_schema(schema):
+def get_example_from_schema(schema, components=None, cache=None):
     """Generate example data from JSON schema"""
     example = {}
     
     if "$ref" in schema:
-        # Handle references (simplified)
-        return {}
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        if components is None or name not in components:
+            return {}
+        if cache is None:
+            cache = {}
+        if name not in cache:
+            # Seed the entry first so self-referencing schemas terminate
+            cache[name] = {}
+            cache[name] = get_example_from_schema(components[name], components, cache)
+        return cache[name]
     
     schema_type = schema.get("type", "object")
     
     if schema_type == "object":
         properties = schema.get("properties", {})
         for prop_name, prop_schema in properties.items():
-            example[prop_name] = get_example_from_schema(prop_schema)
+            example[prop_name] = get_example_from_schema(prop_schema, components, cache)
     elif schema_type == "array":
         items = schema.get("items", {})
-        example = [get_example_from_schema(items)]
+        example = [get_example_from_schema(items, components, cache)]
     elif schema_type == "string":
         example = schema.get("example", "string")
     elif schema_type == "integer":
@@ -1,33 +1,164 @@
+import os
+import shutil
+import tempfile
+import threading
+import httpx
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+# Cheap password hashing for tests; must be set before the app is imported
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+# Under pytest-xdist each worker gets its own drive/mail storage roots, so
+# files written by different workers don't collide. The services create
+# these directories at import, so they are set before the app is imported.
+WORKER_STORAGE = None
+if os.environ.get("PYTEST_XDIST_WORKER") is not None:
+    WORKER_STORAGE = tempfile.mkdtemp(prefix=f"oxla-{os.environ['PYTEST_XDIST_WORKER']}-")
+    os.environ["MAIL_STORAGE_PATH"] = os.path.join(WORKER_STORAGE, "storage")
+    os.environ["DRIVE_STORAGE_PATH"] = os.path.join(WORKER_STORAGE, "drive_storage")
+
 from app.main import app
 from app.models import Base, get_db
 from app.config import settings
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# Test database: one shared in-memory connection, so the schema created by
+# the fixtures is visible to every session the app opens
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+class ConcurrentSession(Session):
+    """Session that concurrent requests can share.
+    
+    Sync dependencies run in the threadpool while async endpoints run on the
+    event loop, so each database operation takes a lock for its own duration
+    only; requests still interleave between operations.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
+    
+    def execute(self, *args, **kwargs):
+        with self._lock:
+            return super().execute(*args, **kwargs)
+    
+    def flush(self, *args, **kwargs):
+        with self._lock:
+            return super().flush(*args, **kwargs)
+    
+    def commit(self):
+        with self._lock:
+            return super().commit()
+    
+    def rollback(self):
+        with self._lock:
+            return super().rollback()
+    
+    def refresh(self, *args, **kwargs):
+        with self._lock:
+            return super().refresh(*args, **kwargs)
+
+ConcurrentSessionLocal = sessionmaker(class_=ConcurrentSession, autocommit=False, autoflush=False)
+
+# Let SQLAlchemy manage transactions itself; pysqlite's implicit BEGIN
+# handling breaks the SAVEPOINTs used to isolate each test
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+# Skip durability work the throwaway test database doesn't need
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+@event.listens_for(engine, "begin")
+def _begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+@pytest.fixture(scope="session", autouse=True)
+def _worker_storage():
+    yield
+    if WORKER_STORAGE is not None:
+        shutil.rmtree(WORKER_STORAGE, ignore_errors=True)
 
-app.dependency_overrides[get_db] = override_get_db
+@pytest.fixture(autouse=True)
+def _reset_rate_limits():
+    # The limiter keeps per-process state; start every test from a clean slate
+    from app.tasks.monitoring_tasks import _reset_rate_limit_state
+    _reset_rate_limit_state()
+    yield
+    _reset_rate_limit_state()
 
-@pytest.fixture(scope="function")
-def client():
+@pytest.fixture(scope="session")
+def _engine():
     Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="session")
+def _client(_engine):
     with TestClient(app) as c:
         yield c
-    Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture
+def db_session(_engine):
+    # Each test runs inside a transaction that is rolled back afterwards;
+    # commits made by the app only release a SAVEPOINT within it
+    connection = _engine.connect()
+    transaction = connection.begin()
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    yield session
+    
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+@pytest.fixture
+def client(_client, db_session):
+    def override_get_db():
+        yield db_session
+    
+    app.dependency_overrides[get_db] = override_get_db
+    yield _client
+    app.dependency_overrides.pop(get_db, None)
+
+@pytest_asyncio.fixture
+async def async_client(db_session):
+    """AsyncClient for requests that should run concurrently.
+    
+    Requests share one session joined to the test's transaction, so they
+    see the test's data and are rolled back with it.
+    """
+    session = ConcurrentSessionLocal(bind=db_session.bind, join_transaction_mode="create_savepoint")
+    
+    def override_get_db():
+        yield session
+    
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            yield ac
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        session.close()
+
+@pytest.fixture(scope="session")
 def test_user_data():
     return {
         "name": "Test User",
@@ -35,14 +166,53 @@ def test_user_data():
         "password": "testpassword123"
     }
 
-@pytest.fixture
-def test_user(client, test_user_data):
-    response = client.post("/auth/register", json=test_user_data)
+@pytest.fixture(scope="session")
+def test_user(_client, test_user_data):
+    # Registered once and committed outside the per-test transactions, so
+    # every test sees it and their rollbacks leave it in place
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = _client.post("/auth/register", json=test_user_data)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+    
     assert response.status_code == 200
     return response.json()
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def auth_headers(test_user):
     return {
         "Authorization": f"Bearer {test_user['access_token']}"
-    }
\ No newline at end of file
+    }
+
+@pytest.fixture
+def db_user(db_session, test_user, test_user_data):
+    """The registered test user as a row in the per-test session"""
+    from app.models import User
+    return db_session.query(User).filter(User.email == test_user_data["email"]).first()
+
+@pytest.fixture
+def email_data():
+    return {
+        "recipient": "test@example.com",
+        "subject": "Test Subject",
+        "body_text": "Test body"
+    }
+
+@pytest.fixture
+def alias_data():
+    return {
+        "alias_name": "test",
+        "is_disposable": False
+    }
+
+@pytest.fixture
+def folder_data():
+    return {"name": "test_folder"}
@@ -2,31 +2,38 @@ import pytest
 from fastapi import status
 from app.models import UserPlan
 
-def test_register_user(client, test_user_data):
+def test_register_user(client):
     """Test user registration"""
-    response = client.post("/auth/register", json=test_user_data)
+    user_data = {
+        "name": "New User",
+        "email": "new-user@example.com",
+        "password": "testpassword123"
+    }
+    response = client.post("/auth/register", json=user_data)
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert "access_token" in data
     assert "refresh_token" in data
     assert data["token_type"] == "bearer"
 
-def test_register_duplicate_email(client, test_user_data):
+def test_register_duplicate_email(client):
     """Test registration with duplicate email"""
+    user_data = {
+        "name": "Duplicate User",
+        "email": "duplicate@example.com",
+        "password": "testpassword123"
+    }
+    
     # First registration
-    client.post("/auth/register", json=test_user_data)
+    client.post("/auth/register", json=user_data)
     
     # Second registration with same email
-    response = client.post("/auth/register", json=test_user_data)
+    response = client.post("/auth/register", json=user_data)
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert "Email already registered" in response.json()["detail"]
 
-def test_login_user(client, test_user_data):
+def test_login_user(client, test_user, test_user_data):
     """Test user login"""
-    # Register user first
-    client.post("/auth/register", json=test_user_data)
-    
-    # Login
     login_data = {
         "email": test_user_data["email"],
         "password": test_user_data["password"]
@@ -37,11 +44,8 @@ def test_login_user(client, test_user_data):
     assert "access_token" in data
     assert "refresh_token" in data
 
-def test_login_invalid_credentials(client, test_user_data):
+def test_login_invalid_credentials(client, test_user, test_user_data):
     """Test login with invalid credentials"""
-    # Register user first
-    client.post("/auth/register", json=test_user_data)
-    
     # Login with wrong password
     login_data = {
         "email": test_user_data["email"],
@@ -78,12 +82,49 @@ def test_refresh_token(client, test_user):
     assert "access_token" in data
     assert data["token_type"] == "bearer"
 
-def test_email_verification_flow(client, test_user_data):
-    """Test email verification flow"""
-    # Register user
-    register_response = client.post("/auth/register", json=test_user_data)
-    assert register_response.status_code == 200
+def test_verify_token_is_cached(test_user, test_user_data):
+    """Test repeated verification of the same token skips re-decoding"""
+    from app.utils import AuthManager
+    from app.utils.auth import _decode_token_cached
+    
+    token = test_user["access_token"]
+    AuthManager.verify_token(token)
+    hits = _decode_token_cached.cache_info().hits
+    
+    payload = AuthManager.verify_token(token)
+    assert _decode_token_cached.cache_info().hits == hits + 1
+    assert payload["sub"] == test_user_data["email"]
     
+    # Callers get their own copy of the cached payload
+    payload["sub"] = "changed@example.com"
+    assert AuthManager.verify_token(token)["sub"] == test_user_data["email"]
+
+def test_password_cache_is_thread_safe(monkeypatch):
+    """Test concurrent password checks while the verification cache evicts"""
+    from collections import OrderedDict
+    from concurrent.futures import ThreadPoolExecutor
+    from app.utils import AuthManager
+    from app.utils import auth
+    
+    # A cache smaller than the working set evicts on nearly every miss
+    monkeypatch.setattr(auth, "PASSWORD_CACHE_SIZE", 2)
+    monkeypatch.setattr(auth, "_verified_passwords", OrderedDict())
+    credentials = [
+        (f"password{i}", AuthManager.get_password_hash(f"password{i}"))
+        for i in range(4)
+    ]
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(
+            lambda credential: AuthManager.verify_password(*credential),
+            credentials * 50
+        ))
+    
+    assert all(results)
+    assert len(auth._verified_passwords) <= 2
+
+def test_email_verification_flow(client, test_user, test_user_data):
+    """Test email verification flow"""
     # Check user is not verified
     login_response = client.post("/auth/login", json={
         "email": test_user_data["email"],
@@ -103,11 +144,8 @@ def test_email_verification_flow(client, test_user_data):
     verify_response = client.post("/auth/verify-email", json=verify_data)
     assert verify_response.status_code == status.HTTP_404_NOT_FOUND
 
-def test_password_reset_flow(client, test_user_data):
+def test_password_reset_flow(client, test_user, test_user_data):
     """Test password reset flow"""
-    # Register user
-    client.post("/auth/register", json=test_user_data)
-    
     # Request password reset
     reset_request_data = {"email": test_user_data["email"]}
     response = client.post("/auth/request-reset", json=reset_request_data)
@@ -9,27 +9,42 @@ def test_upload_file_unauthorized(client):
     response = client.post("/drive/upload")
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY  # Missing file parameter
 
-def test_create_folder_unauthorized(client):
-    """Test creating folder without authentication"""
-    folder_data = {"name": "test_folder"}
-    response = client.post("/drive/folders", json=folder_data)
+@pytest.mark.parametrize("method,url,payload", [
+    ("post", "/drive/folders", "folder_data"),
+    ("get", "/drive/list", None),
+    ("get", "/drive/storage-stats", None),
+    ("delete", "/drive/files/1", None),
+    ("get", "/drive/download/1", None),
+    ("post", "/drive/share/1", None),
+])
+def test_requires_auth(client, request, method, url, payload):
+    """Test protected drive endpoints reject unauthenticated requests"""
+    # Payloads name conftest fixtures, so bodies match the authorized tests
+    kwargs = {"json": request.getfixturevalue(payload)} if payload else {}
+    response = getattr(client, method)(url, **kwargs)
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
-def test_create_folder_authorized(client, auth_headers):
+def test_create_folder_authorized(client, auth_headers, folder_data):
     """Test creating folder with authentication"""
-    folder_data = {"name": "test_folder"}
     response = client.post("/drive/folders", json=folder_data, headers=auth_headers)
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert "folder_id" in data
     assert data["name"] == "test_folder"
 
-def test_create_subfolder(client, auth_headers):
+@pytest.fixture
+def existing_folder(db_session, db_user):
+    """A folder owned by the test user, created directly in the database"""
+    from app.models import DriveFolder
+    
+    folder = DriveFolder(user_id=db_user.id, name="parent_folder", path="parent_folder")
+    db_session.add(folder)
+    db_session.commit()
+    return folder
+
+def test_create_subfolder(client, auth_headers, existing_folder):
     """Test creating subfolder"""
-    # First create parent folder
-    parent_data = {"name": "parent_folder"}
-    parent_response = client.post("/drive/folders", json=parent_data, headers=auth_headers)
-    parent_id = parent_response.json()["folder_id"]
+    parent_id = existing_folder.id
     
     # Create subfolder
     subfolder_data = {"name": "subfolder", "parent_id": parent_id}
@@ -38,11 +53,6 @@ def test_create_subfolder(client, auth_headers):
     data = response.json()
     assert data["parent_id"] == parent_id
 
-def test_list_files_unauthorized(client):
-    """Test listing files without authentication"""
-    response = client.get("/drive/list")
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
-
 def test_list_files_authorized(client, auth_headers):
     """Test listing files with authentication"""
     response = client.get("/drive/list", headers=auth_headers)
@@ -53,44 +63,28 @@ def test_list_files_authorized(client, auth_headers):
     assert isinstance(data["folders"], list)
     assert isinstance(data["files"], list)
 
-def test_list_files_in_folder(client, auth_headers):
+def test_list_files_in_folder(client, auth_headers, existing_folder):
     """Test listing files in specific folder"""
-    # Create a folder first
-    folder_data = {"name": "test_folder"}
-    folder_response = client.post("/drive/folders", json=folder_data, headers=auth_headers)
-    folder_id = folder_response.json()["folder_id"]
-    
-    # List files in that folder
-    response = client.get(f"/drive/list?folder_id={folder_id}", headers=auth_headers)
+    response = client.get(f"/drive/list?folder_id={existing_folder.id}", headers=auth_headers)
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert isinstance(data["folders"], list)
     assert isinstance(data["files"], list)
 
-def test_create_share_link_unauthorized(client):
-    """Test creating share link without authentication"""
-    response = client.post("/drive/share/1")
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
-
 def test_create_share_link_authorized(client, auth_headers):
     """Test creating share link with authentication"""
     # This test would need a file to share, which is complex to create in tests
     # For now, we'll test that the endpoint requires authentication
     share_data = {"share_type": "view"}
     response = client.post("/drive/share/1", json=share_data, headers=auth_headers)
-    # This will likely fail because file 1 doesn't exist
-    assert response.status_code in [status.HTTP_404_NOT_FOUND, status.HTTP_400_BAD_REQUEST]
+    # File 1 doesn't exist, which the handler reports as not found
+    assert response.status_code == status.HTTP_404_NOT_FOUND
 
 def test_access_shared_file_no_auth(client):
     """Test accessing shared file without authentication (should work)"""
     response = client.get("/drive/share/fake_token")
     assert response.status_code == status.HTTP_404_NOT_FOUND  # Invalid token
 
-def test_get_storage_stats_unauthorized(client):
-    """Test getting storage stats without authentication"""
-    response = client.get("/drive/storage-stats")
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
-
 def test_get_storage_stats_authorized(client, auth_headers):
     """Test getting storage stats with authentication"""
     response = client.get("/drive/storage-stats", headers=auth_headers)
@@ -101,11 +95,6 @@ def test_get_storage_stats_authorized(client, auth_headers):
     assert "storage_limit_gb" in data
     assert "usage_percentage" in data
 
-def test_delete_file_unauthorized(client):
-    """Test deleting file without authentication"""
-    response = client.delete("/drive/files/1")
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
-
 def test_delete_file_authorized(client, auth_headers):
     """Test deleting file with authentication"""
     # This test would need a file to delete, which is complex to create in tests
@@ -113,11 +102,6 @@ def test_delete_file_authorized(client, auth_headers):
     # This will likely fail because file 1 doesn't exist
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
-def test_download_file_unauthorized(client):
-    """Test downloading file without authentication"""
-    response = client.get("/drive/download/1")
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
-
 def test_download_file_authorized(client, auth_headers):
     """Test downloading file with authentication"""
     # This test would need a file to download, which is complex to create in tests
@@ -161,4 +145,21 @@ def test_share_link_expiration():
     
     # Test expired link
     expired_at = datetime.utcnow() - timedelta(hours=1)
-    assert expired_at < datetime.utcnow()
\ No newline at end of file
+    assert expired_at < datetime.utcnow()
+
+@pytest.mark.asyncio
+async def test_read_only_endpoints(async_client, auth_headers):
+    """Test independent read-only endpoints concurrently"""
+    import asyncio
+    
+    stats, listing, inbox, unread = await asyncio.gather(
+        async_client.get("/drive/storage-stats", headers=auth_headers),
+        async_client.get("/drive/list", headers=auth_headers),
+        async_client.get("/mail/inbox", headers=auth_headers),
+        async_client.get("/mail/unread-count", headers=auth_headers),
+    )
+    
+    assert stats.status_code == status.HTTP_200_OK
+    assert listing.status_code == status.HTTP_200_OK
+    assert inbox.status_code == status.HTTP_200_OK
+    assert unread.status_code == status.HTTP_200_OK
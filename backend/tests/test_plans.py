@@ -1,9 +1,13 @@
 import pytest
 from app.plans import PlanFeatures
 
+FREE = PlanFeatures.get_plan_features("free")
+PRO = PlanFeatures.get_plan_features("pro")
+ENTERPRISE = PlanFeatures.get_plan_features("enterprise")
+
 def test_free_plan_features():
     """Test free plan features"""
-    features = PlanFeatures.get_plan_features("free")
+    features = FREE
     
     assert features["storage_limit_gb"] == 5
     assert features["max_upload_size_mb"] == 50
@@ -20,7 +24,7 @@ def test_free_plan_features():
 
 def test_pro_plan_features():
     """Test pro plan features"""
-    features = PlanFeatures.get_plan_features("pro")
+    features = PRO
     
     assert features["storage_limit_gb"] == 50
     assert features["max_upload_size_mb"] == 2048
@@ -36,7 +40,7 @@ def test_pro_plan_features():
 
 def test_enterprise_plan_features():
     """Test enterprise plan features"""
-    features = PlanFeatures.get_plan_features("enterprise")
+    features = ENTERPRISE
     
     assert features["storage_limit_gb"] == "unlimited"
     assert features["max_upload_size_mb"] == "unlimited"
@@ -49,69 +53,64 @@ def test_enterprise_plan_features():
     assert "24/7_phone_support" in features["features"]
     assert "custom_policies" in features["features"]
 
-def test_feature_access():
-    """Test feature access checking"""
+@pytest.mark.parametrize("plan,feature,expected", [
     # Free plan features
-    assert PlanFeatures.check_feature_access("free", "basic_email_features") is True
-    assert PlanFeatures.check_feature_access("free", "custom_domains") is False
-    
+    ("free", "basic_email_features", True),
+    ("free", "custom_domains", False),
     # Pro plan features
-    assert PlanFeatures.check_feature_access("pro", "basic_email_features") is True
-    assert PlanFeatures.check_feature_access("pro", "custom_domains") is True
-    assert PlanFeatures.check_feature_access("pro", "24/7_phone_support") is False
-    
+    ("pro", "basic_email_features", True),
+    ("pro", "custom_domains", True),
+    ("pro", "24/7_phone_support", False),
     # Enterprise plan features
-    assert PlanFeatures.check_feature_access("enterprise", "basic_email_features") is True
-    assert PlanFeatures.check_feature_access("enterprise", "custom_domains") is True
-    assert PlanFeatures.check_feature_access("enterprise", "24/7_phone_support") is True
+    ("enterprise", "basic_email_features", True),
+    ("enterprise", "custom_domains", True),
+    ("enterprise", "24/7_phone_support", True),
+])
+def test_feature_access(plan, feature, expected):
+    """Test feature access checking"""
+    assert PlanFeatures.check_feature_access(plan, feature) is expected
 
-def test_storage_limits():
+@pytest.mark.parametrize("plan,usage_gb,expected", [
+    ("free", 4, True),
+    ("free", 5, True),
+    ("free", 6, False),
+    ("pro", 49, True),
+    ("pro", 50, True),
+    ("pro", 51, False),
+    ("enterprise", 1000, True),
+    ("enterprise", 1000000, True),
+])
+def test_storage_limits(plan, usage_gb, expected):
     """Test storage limit checking"""
-    # Free plan
-    assert PlanFeatures.check_storage_limit("free", 4) is True
-    assert PlanFeatures.check_storage_limit("free", 5) is True
-    assert PlanFeatures.check_storage_limit("free", 6) is False
-    
-    # Pro plan
-    assert PlanFeatures.check_storage_limit("pro", 49) is True
-    assert PlanFeatures.check_storage_limit("pro", 50) is True
-    assert PlanFeatures.check_storage_limit("pro", 51) is False
-    
-    # Enterprise plan
-    assert PlanFeatures.check_storage_limit("enterprise", 1000) is True
-    assert PlanFeatures.check_storage_limit("enterprise", 1000000) is True
+    assert PlanFeatures.check_storage_limit(plan, usage_gb) is expected
 
-def test_upload_size_limits():
+@pytest.mark.parametrize("plan,size_mb,expected", [
+    ("free", 49, True),
+    ("free", 50, True),
+    ("free", 51, False),
+    ("pro", 2047, True),
+    ("pro", 2048, True),
+    ("pro", 2049, False),
+    ("enterprise", 10000, True),
+    ("enterprise", 1000000, True),
+])
+def test_upload_size_limits(plan, size_mb, expected):
     """Test upload size limit checking"""
-    # Free plan
-    assert PlanFeatures.check_upload_size("free", 49) is True
-    assert PlanFeatures.check_upload_size("free", 50) is True
-    assert PlanFeatures.check_upload_size("free", 51) is False
-    
-    # Pro plan
-    assert PlanFeatures.check_upload_size("pro", 2047) is True
-    assert PlanFeatures.check_upload_size("pro", 2048) is True
-    assert PlanFeatures.check_upload_size("pro", 2049) is False
-    
-    # Enterprise plan
-    assert PlanFeatures.check_upload_size("enterprise", 10000) is True
-    assert PlanFeatures.check_upload_size("enterprise", 1000000) is True
+    assert PlanFeatures.check_upload_size(plan, size_mb) is expected
 
-def test_team_member_limits():
+@pytest.mark.parametrize("plan,members,expected", [
+    ("free", 0, True),
+    ("free", 1, True),
+    ("free", 2, False),
+    ("pro", 9, True),
+    ("pro", 10, True),
+    ("pro", 11, False),
+    ("enterprise", 100, True),
+    ("enterprise", 10000, True),
+])
+def test_team_member_limits(plan, members, expected):
     """Test team member limit checking"""
-    # Free plan
-    assert PlanFeatures.check_team_member_limit("free", 0) is True
-    assert PlanFeatures.check_team_member_limit("free", 1) is True
-    assert PlanFeatures.check_team_member_limit("free", 2) is False
-    
-    # Pro plan
-    assert PlanFeatures.check_team_member_limit("pro", 9) is True
-    assert PlanFeatures.check_team_member_limit("pro", 10) is True
-    assert PlanFeatures.check_team_member_limit("pro", 11) is False
-    
-    # Enterprise plan
-    assert PlanFeatures.check_team_member_limit("enterprise", 100) is True
-    assert PlanFeatures.check_team_member_limit("enterprise", 10000) is True
+    assert PlanFeatures.check_team_member_limit(plan, members) is expected
 
 def test_plan_limits():
     """Test getting plan limits"""
@@ -131,7 +130,7 @@ def test_invalid_plan():
     """Test handling of invalid plan names"""
     features = PlanFeatures.get_plan_features("invalid_plan")
     # Should default to free plan features
-    assert features == PlanFeatures.get_plan_features("free")
+    assert features == FREE
     
     # Feature access should work the same way
     assert PlanFeatures.check_feature_access("invalid_plan", "basic_email_features") is True